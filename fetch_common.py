@@ -0,0 +1,67 @@
+"""Helpers shared by fetch_literature_en.py and fetch_literature_fr.py."""
+import functools
+import hashlib
+import json
+import os
+import time
+from urllib import parse
+
+import requests
+
+
+def disk_cached(cache_dir, max_age):
+    """Decorator caching fn(*args) results as JSON under cache_dir for max_age seconds.
+
+    Failures and empty answers are not cached; for CrossRef's {'message': {'items': [...]}}
+    that means an empty item list.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            key = hashlib.sha1(json.dumps([fn.__module__, fn.__name__, *args]).encode('utf-8')).hexdigest()
+            path = os.path.join(cache_dir, key + '.json')
+            try:
+                if time.time() - os.path.getmtime(path) < max_age:
+                    with open(path, encoding='utf-8') as f:
+                        return json.load(f)
+            except (OSError, ValueError):
+                pass
+            result = fn(*args)
+            found = result.get('message', {}).get('items') if isinstance(result, dict) else result
+            if found:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(result, f)
+            return result
+        return wrapper
+    return decorate
+
+
+def url_key(url):
+    """URL with scheme/host lower-cased and fragment and trailing slash dropped, for spotting repeats."""
+    parts = parse.urlsplit(url.strip())
+    return parts._replace(scheme=parts.scheme.lower(), netloc=parts.netloc.lower(),
+                          fragment='').geturl().rstrip('/')
+
+
+def needs_download(session, url, path, throttle=None):
+    """False if path already holds the full file, judged by a HEAD request's Content-Length.
+
+    `throttle(url)` is called before the HEAD, for callers that pace requests per host.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return True
+    if size == 0:
+        return True  # leftover from a failed download
+    try:
+        if throttle is not None:
+            throttle(url)
+        h = session.head(url, allow_redirects=True, timeout=15)
+        length = int(h.headers.get('Content-Length', -1)) if h.ok else -1
+        if h.headers.get('Content-Encoding'):
+            length = -1  # iter_content saves the decoded body, so the sizes never match
+    except (requests.RequestException, ValueError):
+        return False  # can't check; keep the copy we have
+    return length >= 0 and length != size
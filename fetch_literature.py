@@ -12,22 +12,47 @@ Sources:
 - LibGen (open-access book/paper repository)
 - Sci-Hub (PDF access for DOIs)
 
+Set CROSSREF_MAILTO=you@example.org to use CrossRef's polite pool.
+
 Note: LibGen and Sci-Hub access may be unreliable due to network restrictions.
 """
 import csv
-import json
+import itertools
 import os
 import re
+import shutil
+import socket
+import string
 import sys
+import threading
 import time
-from urllib import parse, request, error
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib import parse
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:
     print('requests library not found. Install with: pip install requests')
     sys.exit(1)
 
+try:
+    import orjson as _json  # faster decode of CrossRef pages; takes bytes directly
+except ImportError:
+    import json as _json
+
+try:
+    from requests_cache import CachedSession
+except ImportError:
+    CachedSession = None  # no on-disk cache; every run hits the network
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None  # fall back to regex scraping of LibGen pages
+
 BASE_DIR = os.path.dirname(__file__)
 KEYWORDS_FILE = os.path.join(BASE_DIR, 'keywords.md')
 URLS_FILE = os.path.join(BASE_DIR, 'urls.txt')
@@ -35,166 +60,386 @@ METADATA_CSV = os.path.join(BASE_DIR, 'metadata.csv')
 SUMMARY_CSV = os.path.join(BASE_DIR, 'summary.csv')
 REF_DIR = os.path.join(BASE_DIR, 'References')
 
+# Contact address for CrossRef's "polite" pool (faster, less throttled than anonymous access)
+MAILTO = os.environ.get('CROSSREF_MAILTO', '')
+CROSSREF_HEADERS = {'User-Agent': f'ChiMai-Lit/1.0 (mailto:{MAILTO})'} if MAILTO else {}
+
 os.makedirs(REF_DIR, exist_ok=True)
 
+# One pooled session for every lookup so connections to CrossRef and the
+# mirrors are kept alive instead of re-handshaking per call. With requests-cache
+# installed, search/lookup responses are also kept for a day so re-runs skip the
+# network; 402/403 are cached on purpose so paywalled Sci-Hub misses aren't
+# retried every run. PDFs go through DOWNLOAD_SESSION, which never caches, so
+# they stay streamed to disk whatever Content-Type a mirror sends.
+if CachedSession is not None:
+    SESSION = CachedSession(
+        os.path.join(BASE_DIR, 'http_cache.sqlite'),
+        expire_after=60 * 60 * 24,
+        allowable_codes=(200, 301, 302, 402, 403),
+    )
+    DOWNLOAD_SESSION = requests.Session()
+else:
+    SESSION = DOWNLOAD_SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64,
+                       max_retries=Retry(total=2, backoff_factor=0.3,
+                                         status_forcelist=(429, 500, 502, 503, 504)))
+for _s in {SESSION, DOWNLOAD_SESSION}:
+    _s.headers.update({'User-Agent': 'Mozilla/5.0'})
+    _s.mount('https://', _adapter)
+    _s.mount('http://', _adapter)
+
+_orig_getaddrinfo = socket.getaddrinfo
+_dns_cache = {}
+
+def _cached_getaddrinfo(host, port, *args, **kwargs):
+    key = (host, port, args, tuple(sorted(kwargs.items())))
+    addrs = _dns_cache.get(key)
+    if addrs is None:
+        addrs = _dns_cache[key] = _orig_getaddrinfo(host, port, *args, **kwargs)
+    return addrs
+
+def enable_dns_cache():
+    """Resolve each host once per run; downloads cluster on a few mirrors and CDNs."""
+    socket.getaddrinfo = _cached_getaddrinfo
+
+DOWNLOAD_WORKERS = 8
+PER_HOST_DOWNLOADS = 4
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+def _host_slot(url):
+    """Semaphore limiting concurrent downloads from the host of `url`."""
+    host = parse.urlparse(url).netloc
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.Semaphore(PER_HOST_DOWNLOADS)
+        return _host_slots[host]
+
+_WS = re.compile(r'\s+')
+_FN_ALLOWED = set(string.ascii_letters + string.digits + '_-.')
+_FN_DELETE = {c: None for c in range(128) if chr(c) not in _FN_ALLOWED}
+_NONWORD = re.compile(r'\W+')
+_TR = re.compile(r'<tr.*?>(.*?)</tr>', re.DOTALL)
+_TD = re.compile(r'<td.*?>(.*?)</td>', re.DOTALL)
+_TAG = re.compile(r'<[^>]+>')
+_DOWNLOAD_HREF = re.compile(r'href="([^"]*download[^"]*)"')
+_PDF_SRC = re.compile(r'src="([^"]*\.pdf[^"]*)"')
+_PDF_HREF = re.compile(r'href="([^"]*\.pdf[^"]*)"')
+
+def _vietnamese_keywords(lines):
+    for line in lines:  # skip ahead to the Vietnamese section
+        if line.strip() == '## Tiếng Việt':
+            break
+    for line in lines:
+        s = line.strip()
+        if s.startswith('##'):
+            break  # Stop at next section
+        # skip blanks, comments and section headers
+        if not s or s.startswith('#') or s.endswith(':'):
+            continue
+        yield s[1:].strip() if s.startswith('-') else s
+
 def read_keywords():
-    kws = []
-    in_vietnamese = False
     with open(KEYWORDS_FILE, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line == '## Tiếng Việt':
-                in_vietnamese = True
-                continue
-            elif line.startswith('##') and in_vietnamese:
-                break  # Stop at next section
-            if in_vietnamese:
-                if not line or line.startswith('#'):
-                    continue
-                # skip section headers
-                if line.endswith(':'):
-                    continue
-                # if line starts with '-', remove it
-                if line.startswith('-'):
-                    line = line[1:].strip()
-                kws.append(line)
-    return kws
+        return list(_vietnamese_keywords(f))
 
 def sanitize_filename(s):
-    s = re.sub(r'\s+', '_', s)
-    s = re.sub(r'[^0-9A-Za-z_\-\.]+', '', s)
-    return s[:200]
-
-def append_urls(url, preferred):
-    with open(URLS_FILE, 'a', encoding='utf-8') as f:
-        f.write(f"{url}\t{preferred}\n")
-
-def append_metadata(row):
-    exists = os.path.exists(METADATA_CSV)
-    with open(METADATA_CSV, 'a', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        if os.path.getsize(METADATA_CSV) == 0:
-            writer.writerow(['filename','title','authors','year','journal','doi','url','abstract','language'])
-        writer.writerow(row)
-
-def append_summary(row):
-    with open(SUMMARY_CSV, 'a', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        if os.path.getsize(SUMMARY_CSV) == 0:
-            writer.writerow(['filename','objective','methods','main_findings','relevance_notes'])
-        writer.writerow(row)
-
-def query_crossref(query, rows=20, offset=0):
+    # non-ASCII is dropped by the encode, other disallowed characters by the table
+    s = _WS.sub('_', s).encode('ascii', 'ignore').decode('ascii')
+    return s.translate(_FN_DELETE)[:200]
+
+def build_filename(year, authors, title):
+    """PDF file name from year, first author's last name and a shortened title."""
+    first = authors.split(';', 1)[0].split() if authors else None
+    last_author = first[-1] if first else 'anon'
+    short = _NONWORD.sub('_', title)[:50]
+    base = f'{year}_{last_author}_{short}' if year else f'{last_author}_{short}'
+    return sanitize_filename(base) + '.pdf'
+
+METADATA_HEADER = ['filename','title','authors','year','journal','doi','url','abstract','language']
+SUMMARY_HEADER = ['filename','objective','methods','main_findings','relevance_notes']
+
+@contextmanager
+def open_csv_writers():
+    """Open metadata.csv, summary.csv and urls.txt once for the run.
+
+    Yields the two csv writers and the urls.txt file handle.
+    """
+    with open(METADATA_CSV, 'a', encoding='utf-8', newline='') as mf, \
+         open(SUMMARY_CSV, 'a', encoding='utf-8', newline='') as sf, \
+         open(URLS_FILE, 'a', encoding='utf-8', buffering=1 << 16) as urls_fh:
+        meta_writer = csv.writer(mf)
+        summary_writer = csv.writer(sf)
+        # append mode starts at end of file, so tell() == 0 means empty; no stat needed
+        if mf.tell() == 0:
+            meta_writer.writerow(METADATA_HEADER)
+        if sf.tell() == 0:
+            summary_writer.writerow(SUMMARY_HEADER)
+        yield meta_writer, summary_writer, urls_fh
+
+def query_crossref(query, rows=20, cursor='*'):
+    """One page of a CrossRef search; pass the previous page's 'next-cursor' to continue."""
     q = parse.quote(query)
-    url = f'https://api.crossref.org/works?query={q}&rows={rows}&offset={offset}'
+    url = f'https://api.crossref.org/works?query={q}&rows={rows}&cursor={parse.quote(cursor)}'
+    if MAILTO:
+        url += f'&mailto={parse.quote(MAILTO)}'
     try:
-        with request.urlopen(url, timeout=30) as resp:
-            data = resp.read()
-            return json.loads(data.decode('utf-8'))
-    except error.URLError as e:
+        resp = SESSION.get(url, headers=CROSSREF_HEADERS, timeout=30)
+        resp.raise_for_status()
+        return _json.loads(resp.content)
+    except requests.RequestException as e:
         print('Network error querying CrossRef:', e)
         return None
 
 def download_file(url, outpath, timeout=60):
+    """Stream `url` to `outpath`; returns False (and writes nothing) unless the body is a PDF."""
+    tmp = outpath + '.part'
     try:
-        req = request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        with request.urlopen(req, timeout=timeout) as resp:
-            with open(outpath, 'wb') as f:
-                f.write(resp.read())
+        with _host_slot(url), DOWNLOAD_SESSION.get(url, stream=True, timeout=timeout) as r:
+            r.raise_for_status()
+            if 'html' in r.headers.get('Content-Type', '').lower():
+                print('Not a PDF (got', r.headers['Content-Type'] + '):', url)
+                return False
+            r.raw.decode_content = True
+            # mirrors often answer 200 with a captcha/landing page, so check the magic bytes
+            head = r.raw.read(5)
+            if head != b'%PDF-':
+                print('Not a PDF:', url)
+                return False
+            # stream in 64 KiB reads through a 1 MiB file buffer; memory stays flat
+            with open(tmp, 'wb', buffering=1 << 20) as f:
+                f.write(head)
+                shutil.copyfileobj(r.raw, f, length=1 << 16)
+        os.replace(tmp, outpath)
         return True
     except Exception as e:
         print('Download failed for', url, ':', e)
+        if os.path.exists(tmp):
+            os.remove(tmp)  # don't leave a truncated PDF behind
         return False
 
 
+LIBGEN_COLS = 5  # only id, author, title, publisher and year are used
+
+def _libgen_rows(html, rows):
+    """Yield (column_texts, download_href) for the first `rows` result rows of a LibGen page."""
+    if HTMLParser is not None:
+        for row in HTMLParser(html).css('table tr')[1:rows+1]:
+            link = row.css_first('a[href*=download]')
+            yield [c.text(strip=True) for c in row.css('td')[:LIBGEN_COLS]], link.attributes.get('href', '') if link else ''
+        return
+    # scan lazily so we stop after `rows` rows / LIBGEN_COLS cells instead of tokenising the whole page
+    tr_iter = _TR.finditer(html)
+    next(tr_iter, None)  # header row
+    for tr in itertools.islice(tr_iter, rows):
+        row = tr.group(1)
+        cols = [_TAG.sub('', td.group(1)).strip() for td in itertools.islice(_TD.finditer(row), LIBGEN_COLS)]
+        link = _DOWNLOAD_HREF.search(row)
+        yield cols, link.group(1) if link else ''
+
+LIBGEN_MIRRORS = [
+    'https://libgen.is/search.php',
+    'https://libgen.rs/search.php',
+    'https://libgen.st/search.php',
+    'https://libgen.li/search.php',
+    'https://libgen.lc/search.php',
+    'https://libgen.rocks/search.php',
+    'https://libgen.fun/search.php',
+    'https://libgen.me/search.php',
+    'https://libgen.org/search.php',
+    'https://libgen.io/search.php'
+]
+
+# Per-mirror health for this run: mirrors that failed 3+ times in the last
+# 10 minutes are skipped, and a mirror that answers moves to the front.
+_mirror_state = {}
+_mirror_lock = threading.Lock()
+
+def _live_mirrors(mirrors):
+    now = time.time()
+    with _mirror_lock:
+        return [m for m in mirrors
+                if not (_mirror_state.get(m, {}).get('fail', 0) >= 3
+                        and now - _mirror_state[m]['last_fail'] < 600)]
+
+def _mark_mirror(mirrors, mirror, ok):
+    with _mirror_lock:
+        state = _mirror_state.setdefault(mirror, {'ok': 0, 'fail': 0, 'last_fail': 0.0})
+        if ok:
+            state['ok'] += 1
+            if mirror in mirrors:
+                mirrors.remove(mirror)
+                mirrors.insert(0, mirror)
+        else:
+            state['fail'] += 1
+            state['last_fail'] = time.time()
+
 def query_libgen(query, rows=20):
     """Query LibGen mirrors for the query and return list of items with keys: title, authors, year, doi, url, pdf_url."""
-    mirrors = [
-        'https://libgen.is/search.php',
-        'https://libgen.rs/search.php',
-        'https://libgen.st/search.php',
-        'https://libgen.li/search.php',
-        'https://libgen.lc/search.php',
-        'https://libgen.rocks/search.php',
-        'https://libgen.fun/search.php',
-        'https://libgen.me/search.php',
-        'https://libgen.org/search.php',
-        'https://libgen.io/search.php'
-    ]
-    for base in mirrors:
+    for base in _live_mirrors(LIBGEN_MIRRORS):
         try:
             params = {'req': query, 'lg_topic': 'libgen', 'open': '0', 'view': 'simple', 'res': rows, 'phrase': '1', 'column': 'def'}
-            resp = requests.get(base, params=params, timeout=20)
+            resp = SESSION.get(base, params=params, timeout=(3, 20))
             resp.raise_for_status()
-            html = resp.text
+            _mark_mirror(LIBGEN_MIRRORS, base, True)
             items = []
-            # find table rows
-            rows_html = re.findall(r'<tr.*?>(.*?)</tr>', html, re.DOTALL)
-            # Skip header row and parse results
-            for row in rows_html[1:rows+1]:
-                cols = re.findall(r'<td.*?>(.*?)</td>', row, re.DOTALL)
+            for cols, href in _libgen_rows(resp.text, rows):
                 if len(cols) < 5:
                     continue
-                authors = re.sub(r'<[^>]+>', '', cols[1]).strip()
-                title = re.sub(r'<[^>]+>', '', cols[2]).strip()
-                year = re.sub(r'<[^>]+>', '', cols[4]).strip()
+                authors, title, year = cols[1], cols[2], cols[4]
                 # download link (may be relative)
-                mirrors_found = re.findall(r'href="([^"]*download[^"]*)"', row)
-                pdf_url = ''
-                if mirrors_found:
-                    pdf_url = mirrors_found[0]
-                    if pdf_url.startswith('/'):
-                        pdf_url = base.replace('/search.php', '') + pdf_url
+                pdf_url = href
+                if pdf_url.startswith('/'):
+                    pdf_url = base.replace('/search.php', '') + pdf_url
                 doi = ''
                 items.append({'title': title, 'authors': authors, 'year': year, 'doi': doi, 'url': pdf_url, 'pdf_url': pdf_url, 'journal': '', 'abstract': ''})
             if items:
                 return items
         except Exception as e:
-            # try next mirror
-            continue
+            _mark_mirror(LIBGEN_MIRRORS, base, False)
+            continue  # try next mirror
     return []
 
 
-def query_scihub(dois, timeout=20, max_per_run=10):
-    """Query Sci-Hub mirrors for given DOIs and return list of {'doi', 'pdf_url'} matches."""
-    scihub_bases = [
-        'https://sci-hub.se/',
-        'https://sci-hub.ru/',
-        'https://sci-hub.st/',
-        'https://sci-hub.tw/',
-        'https://sci-hub.hk/',
-        'https://sci-hub.mn/',
-        'https://sci-hub.ee/',
-        'https://sci-hub.do/',
-        'https://sci-hub.pl/'
-    ]
-    found = []
-    for doi in (dois or [])[:max_per_run]:
-        if not doi:
+SCIHUB_MIRRORS = [
+    'https://sci-hub.se/',
+    'https://sci-hub.ru/',
+    'https://sci-hub.st/',
+    'https://sci-hub.tw/',
+    'https://sci-hub.hk/',
+    'https://sci-hub.mn/',
+    'https://sci-hub.ee/',
+    'https://sci-hub.do/',
+    'https://sci-hub.pl/'
+]
+SCIHUB_MAX_LOOKUPS = 10  # limit to avoid too many requests per run
+_scihub_misses = set()
+_scihub_lookups = 0
+_scihub_lock = threading.Lock()
+
+def scihub_resolve(doi, timeout=(3, 10)):
+    """Return a PDF URL for `doi` from the first Sci-Hub mirror that has it, or None."""
+    global _scihub_lookups
+    with _scihub_lock:
+        if not doi or doi in _scihub_misses or _scihub_lookups >= SCIHUB_MAX_LOOKUPS:
+            return None
+        _scihub_lookups += 1
+    for base in _live_mirrors(SCIHUB_MIRRORS):
+        try:
+            resp = SESSION.get(base + doi, timeout=timeout)
+            if resp.status_code >= 500:
+                _mark_mirror(SCIHUB_MIRRORS, base, False)
+                continue
+            if resp.status_code != 200:
+                continue  # e.g. 404/403: this mirror lacks the DOI, but it is up
+            # Try to find pdf src or iframe
+            m = _PDF_SRC.search(resp.text)
+            if not m:
+                m = _PDF_HREF.search(resp.text)
+            if m:
+                pdf_url = m.group(1)
+                if pdf_url.startswith('//'):
+                    pdf_url = 'https:' + pdf_url
+                elif pdf_url.startswith('/'):
+                    pdf_url = base.rstrip('/') + pdf_url
+                _mark_mirror(SCIHUB_MIRRORS, base, True)
+                return pdf_url
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.RetryError):
+            # RetryError is what a 5xx turns into once the adapter's retries run out
+            _mark_mirror(SCIHUB_MIRRORS, base, False)
             continue
-        for base in scihub_bases:
-            try:
-                url = base + doi
-                resp = requests.get(url, timeout=timeout, headers={'User-Agent':'Mozilla/5.0'})
-                if resp.status_code != 200:
-                    continue
-                # Try to find pdf src or iframe
-                m = re.search(r'src="([^"]*\.pdf[^"]*)"', resp.text)
-                if not m:
-                    m = re.search(r'href="([^"]*\.pdf[^"]*)"', resp.text)
-                if m:
-                    pdf_url = m.group(1)
-                    if pdf_url.startswith('//'):
-                        pdf_url = 'https:' + pdf_url
-                    elif pdf_url.startswith('/'):
-                        pdf_url = base.rstrip('/') + pdf_url
-                    found.append({'doi': doi, 'pdf_url': pdf_url})
-                    break
-            except Exception:
+        except requests.RequestException:
+            continue
+    _scihub_misses.add(doi)
+    return None
+
+def extract_record(it):
+    """Normalise a CrossRef or LibGen item to one flat dict of the fields we store."""
+    if 'DOI' in it:  # CrossRef item
+        authors = []
+        for a in it.get('author', [])[:6]:
+            name = ' '.join(filter(None, [a.get('given',''), a.get('family','')])).strip()
+            if name:
+                authors.append(name)
+        year = ''
+        try:
+            year = it.get('issued', {}).get('date-parts', [[None]])[0][0] or ''
+        except Exception:
+            year = ''
+        pdf_url = None
+        for l in it.get('link', []) or []:
+            url = l.get('URL')
+            if not url:
                 continue
-    return found
+            content_type = l.get('content-type','')
+            if 'pdf' in content_type.lower() or url.lower().endswith('.pdf'):
+                pdf_url = url
+                break
+        rec = {
+            'doi': it.get('DOI', ''),
+            'title': ' '.join(it.get('title', [])) if it.get('title') else '',
+            'authors': '; '.join(authors),
+            'year': year,
+            'journal': (it.get('container-title') or [''])[0],
+            'abstract': it.get('abstract', ''),
+            'url': it.get('URL', ''),
+            'pdf_url': pdf_url,
+        }
+    else:  # LibGen item
+        rec = {k: it.get(k, '') for k in ('doi', 'title', 'authors', 'year', 'journal', 'abstract', 'url', 'pdf_url')}
+    rec['pdf_name'] = build_filename(rec['year'], rec['authors'], rec['title'])
+    return rec
+
+def dedup_records(items):
+    """Merge items describing the same paper, keyed by DOI or, failing that, file name.
+
+    The first record seen (CrossRef comes first) keeps its metadata; later
+    duplicates only fill in fields it lacks, such as a LibGen PDF link.
+    """
+    best = []
+    index = {}  # DOI and file name -> record, so DOI-less rows still match
+    duplicates = 0
+    for it in items:
+        rec = extract_record(it)
+        doi_key = (rec['doi'] or '').lower()
+        keys = [k for k in (doi_key, rec['pdf_name']) if k]
+        # records with different DOIs are never merged, even if their file names collide
+        kept = index.get(doi_key) if doi_key else index.get(rec['pdf_name'])
+        if kept is None:
+            best.append(rec)
+            kept = rec
+        else:
+            duplicates += 1
+            for field, value in rec.items():
+                if value and not kept.get(field):
+                    kept[field] = value
+        for k in keys:
+            index.setdefault(k, kept)
+    if duplicates:
+        print(f'Merged {duplicates} duplicate records')
+    return best
+
+def fetch_pdf(title, pdf_url, doi, pdf_path):
+    """Download one paper from its direct link, falling back to Sci-Hub."""
+    if pdf_url:
+        print('Downloading PDF for:', title[:80])
+        if download_file(pdf_url, pdf_path):
+            print('Saved to', pdf_path)
+            return True
+        print('Failed to download', pdf_url)
+    # Sci-Hub is slow, so it is only consulted once the direct link has failed
+    scihub_pdf = scihub_resolve(doi)
+    if scihub_pdf:
+        print('Trying Sci-Hub for:', title[:80])
+        if download_file(scihub_pdf, pdf_path):
+            print('Saved from Sci-Hub to', pdf_path)
+            return True
+        print('Failed Sci-Hub download', scihub_pdf)
+    return False
 
 def main():
+    enable_dns_cache()
     kws = read_keywords()
     if not kws:
         print('No keywords found in', KEYWORDS_FILE)
@@ -204,20 +449,20 @@ def main():
     query = ' '.join(kws)
     print('Querying CrossRef for:', query)
     
-    # Search CrossRef with pagination
+    # Search CrossRef with cursor (deep) paging
     all_crossref_items = []
-    offset = 0
+    cursor = '*'
     max_pages = 5  # Fetch up to 5 pages of 50 items each
     for page in range(max_pages):
-        resp = query_crossref(query, rows=50, offset=offset)
+        resp = query_crossref(query, rows=50, cursor=cursor)
         if not resp or 'message' not in resp:
             break
         items = resp['message'].get('items', [])
         if not items:
             break
         all_crossref_items.extend(items)
-        offset += 50
-        if len(items) < 50:  # Last page
+        cursor = resp['message'].get('next-cursor')
+        if len(items) < 50 or not cursor:  # Last page
             break
         time.sleep(2)  # Rate limiting
     
@@ -231,101 +476,37 @@ def main():
         libgen_items = []
         print('LibGen search failed:', e)
 
-    # Collect DOIs for Sci-Hub
-    dois = [it.get('DOI') for it in all_crossref_items if it.get('DOI')] + [it.get('doi') for it in libgen_items if it.get('doi')]
-    scihub_items = []
-    if dois:
-        try:
-            scihub_items = query_scihub(dois)
-            print(f'Found {len(scihub_items)} PDFs from Sci-Hub')
-        except Exception as e:
-            print('Sci-Hub search failed:', e)
+    records = dedup_records(all_crossref_items + libgen_items)
 
     count = 0
-    for it in (all_crossref_items + libgen_items):
-        # Handle different item formats
-        if 'DOI' in it:  # CrossRef item
-            doi = it.get('DOI', '')
-            title = ' '.join(it.get('title', [])) if it.get('title') else ''
-            authors = []
-            for a in it.get('author', [])[:6]:
-                name = ' '.join(filter(None, [a.get('given',''), a.get('family','')])).strip()
-                if name:
-                    authors.append(name)
-            authors_s = '; '.join(authors)
-            year = ''
-            try:
-                year = it.get('issued', {}).get('date-parts', [[None]])[0][0] or ''
-            except Exception:
-                year = ''
-            journal = it.get('container-title', [''])[0]
-            abstract = it.get('abstract', '')
-            url_field = it.get('URL', '')
-            pdf_url = None
-            for l in it.get('link', []) or []:
-                url = l.get('URL')
-                if not url:
-                    continue
-                content_type = l.get('content-type','')
-                if 'pdf' in content_type.lower() or url.lower().endswith('.pdf'):
-                    pdf_url = url
-                    break
-        else:  # LibGen item
-            doi = it.get('doi', '')
-            title = it.get('title', '')
-            authors_s = it.get('authors', '')
-            year = it.get('year', '')
-            journal = it.get('journal', '')
-            abstract = it.get('abstract', '')
-            url_field = it.get('url', '')
-            pdf_url = it.get('pdf_url', '')
-
-        # build filename
-        last_author = authors_s.split(';')[0].strip().split()[-1] if authors_s else 'anon'
-        short = re.sub(r'\W+', '_', title)[:50]
-        filename_base = f"{year}_{last_author}_{short}" if year else f"{last_author}_{short}"
-        filename_base = sanitize_filename(filename_base)
-        pdf_name = filename_base + '.pdf'
-        pdf_path = os.path.join(REF_DIR, pdf_name)
-
-        # append to urls and metadata
-        preferred_url = pdf_url or url_field or ''
-        if preferred_url:
-            append_urls(preferred_url, pdf_name)
-
-        append_metadata([pdf_name, title, authors_s, year, journal, doi, preferred_url, abstract, ''])
-        append_summary([pdf_name, '', '', '', ''])
-
-        # Try to download PDF
-        downloaded = False
-        if pdf_url:
-            if not os.path.exists(pdf_path):
-                print('Downloading PDF for:', title[:80])
-                ok = download_file(pdf_url, pdf_path)
-                if ok:
-                    print('Saved to', pdf_path)
-                    downloaded = True
-                else:
-                    print('Failed to download', pdf_url)
-            else:
-                print('Already downloaded', pdf_name)
-                downloaded = True
-
-        # If no PDF yet, try Sci-Hub
-        if not downloaded and doi:
-            scihub_pdf = next((s['pdf_url'] for s in scihub_items if s['doi'] == doi), None)
-            if scihub_pdf and not os.path.exists(pdf_path):
-                print('Trying Sci-Hub for:', title[:80])
-                ok = download_file(scihub_pdf, pdf_path)
-                if ok:
-                    print('Saved from Sci-Hub to', pdf_path)
-                else:
-                    print('Failed Sci-Hub download', scihub_pdf)
-
-        count += 1
-        if count >= 250:
-            break
-        time.sleep(1)
+    downloads = []
+    queued = set()
+    with open_csv_writers() as (meta_writer, summary_writer, urls_fh):
+        for rec in records:
+            doi, title, pdf_url, pdf_name = rec['doi'], rec['title'], rec['pdf_url'], rec['pdf_name']
+            pdf_path = os.path.join(REF_DIR, pdf_name)
+
+            # append to urls and metadata
+            preferred_url = pdf_url or rec['url'] or ''
+            if preferred_url:
+                urls_fh.write(f"{preferred_url}\t{pdf_name}\n")
+
+            meta_writer.writerow([pdf_name, title, rec['authors'], rec['year'], rec['journal'], doi, preferred_url, rec['abstract'], ''])
+            summary_writer.writerow([pdf_name, '', '', '', ''])
+
+            if os.path.exists(pdf_path):
+                print('Already downloaded', pdf_name)  # no link or Sci-Hub lookups needed
+            elif (pdf_url or doi) and pdf_path not in queued:
+                queued.add(pdf_path)  # two workers must not write the same file
+                downloads.append((title, pdf_url, doi, pdf_path))
+
+            count += 1
+            if count >= 250:
+                break
+
+    # Downloads are I/O-bound, so run them concurrently; CSV rows are already written above
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        list(executor.map(lambda args: fetch_pdf(*args), downloads))
 
     print('Done. Metadata and URLs updated. Check', URLS_FILE, 'and', METADATA_CSV)
 
@@ -2,22 +2,59 @@
 """Fetch literature using the English keyword section from keywords.md and download PDFs.
 
 Writes/updates: urls.txt, metadata.csv, summary.csv and downloads PDFs into References/.
+Set CROSSREF_MAILTO=you@example.org to use CrossRef's polite pool.
 """
 import argparse
 import csv
+import hashlib
+import itertools
 import json
+import mmap
 import os
 import re
+import string
 import sys
+import threading
 import time
-from urllib import parse, request, error
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib import parse
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.exceptions import HTTPError as Urllib3Error
+    from urllib3.util.retry import Retry
 except ImportError:
     print('requests library not found. Install with: pip install requests')
     sys.exit(1)
 
+from fetch_common import disk_cached, needs_download, url_key
+
+try:
+    import orjson as _json  # faster decode of CrossRef pages; takes bytes directly
+except ImportError:
+    _json = json
+
+try:
+    import ijson  # incremental CrossRef parsing for large --max
+except ImportError:
+    ijson = None
+
+# Reading resp.raw bypasses requests' exception wrapping, so the ijson path can
+# also raise raw urllib3 errors and ijson's own (non-ValueError) JSONError.
+_CROSSREF_ERRORS = (requests.RequestException, ValueError, Urllib3Error) + ((ijson.JSONError,) if ijson else ())
+
+try:
+    from lxml import etree as ET  # C-backed XPath for PubMed esummary
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None  # fall back to regex scraping of LibGen pages
+
 BASE_DIR = os.path.dirname(__file__)
 KW_FILE = os.path.join(BASE_DIR, 'keywords.md')
 URLS_FILE = os.path.join(BASE_DIR, 'urls.txt')
@@ -25,117 +62,238 @@ METADATA_CSV = os.path.join(BASE_DIR, 'metadata.csv')
 SUMMARY_CSV = os.path.join(BASE_DIR, 'summary.csv')
 REF_DIR = os.path.join(BASE_DIR, 'References')
 
+# Contact address for CrossRef's "polite" pool (faster, less throttled than anonymous access)
+MAILTO = os.environ.get('CROSSREF_MAILTO', '')
+CROSSREF_HEADERS = {'User-Agent': f'ChiMai-Lit/1.0 (mailto:{MAILTO})'} if MAILTO else {}
+
 os.makedirs(REF_DIR, exist_ok=True)
 
+USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/117.0.0.0 Safari/537.36')
+
+# Shared keep-alive session: PubMed, LibGen, Sci-Hub and PDF hosts are hit
+# repeatedly, so reuse pooled connections rather than a new TCP+TLS per call.
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': USER_AGENT})
+SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                      max_retries=Retry(total=3, backoff_factor=0.3,
+                                                        status_forcelist=[429])))
+
+CROSSREF_WORKERS = 8  # concurrent per-keyword CrossRef searches
+DOWNLOAD_WORKERS = 16
+PER_HOST_DOWNLOADS = 8
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+def _host_slot(url):
+    """Semaphore limiting concurrent downloads from the host of `url`."""
+    host = parse.urlparse(url).netloc
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.Semaphore(PER_HOST_DOWNLOADS)
+        return _host_slots[host]
+
+HOST_MIN_INTERVAL = 0.8  # seconds between request starts to the same host
+_host_locks = defaultdict(threading.Lock)
+_host_last = {}
+
+def _throttle_host(url):
+    """Wait until HOST_MIN_INTERVAL has passed since the last request to this host."""
+    host = parse.urlparse(url).netloc
+    with _host_slots_lock:
+        lock = _host_locks[host]
+    with lock:
+        wait = _host_last.get(host, 0.0) + HOST_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _host_last[host] = time.monotonic()
+
+_WS = re.compile(r'\s+')
+_FN_ALLOWED = set(string.ascii_letters + string.digits + '_-.')
+_FN_DELETE = {c: None for c in range(128) if chr(c) not in _FN_ALLOWED}
+_NONWORD = re.compile(r'\W+')
+_TR = re.compile(r'<tr.*?>(.*?)</tr>', re.DOTALL)
+_TD = re.compile(r'<td.*?>(.*?)</td>', re.DOTALL)
+_TAG = re.compile(r'<[^>]+>')
+_DOWNLOAD_HREF = re.compile(r'href="([^"]*download[^"]*)"')
+_PDF_HREF = re.compile(r'href="([^"]*\.pdf[^"]*)"')
+# body of the "## English..." section, up to the next "## " heading
+_ENGLISH_SECTION = re.compile(rb'^##\s*english[^\n]*$(.*?)(?=^## |\Z)', re.IGNORECASE | re.MULTILINE | re.DOTALL)
+
 def extract_english_keywords():
+    with open(KW_FILE, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            m = _ENGLISH_SECTION.search(mm)
+            section = m.group(1).decode('utf-8') if m else ''
     lines = []
-    in_eng = False
-    with open(KW_FILE, 'r', encoding='utf-8') as f:
-        for line in f:
-            s = line.strip()
-            if s.lower().startswith('## english'):
-                in_eng = True
-                continue
-            if in_eng:
-                if s.startswith('## '):
-                    break
-                if not s or s.startswith('#'):
-                    continue
-                if s.startswith('-'):
-                    s = s[1:].strip()
-                lines.append(s)
+    for line in section.splitlines():
+        s = line.strip()
+        if not s or s.startswith('#'):
+            continue
+        lines.append(s[1:].strip() if s.startswith('-') else s)
     return lines
 
 def sanitize_filename(s):
-    s = re.sub(r'\s+', '_', s)
-    s = re.sub(r'[^0-9A-Za-z_\-\.]+', '', s)
-    return s[:200]
+    # non-ASCII is dropped by the encode, other disallowed characters by the table
+    s = _WS.sub('_', s).encode('ascii', 'ignore').decode('ascii')
+    return s.translate(_FN_DELETE)[:200]
 
-def append_urls(url, preferred):
+def append_urls(pairs):
+    """Append (url, filename) lines to urls.txt in one write."""
     with open(URLS_FILE, 'a', encoding='utf-8') as f:
-        f.write(f"{url}\t{preferred}\n")
-
-def append_metadata(row):
-    with open(METADATA_CSV, 'a', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        if os.path.getsize(METADATA_CSV) == 0:
-            writer.writerow(['filename','title','authors','year','journal','doi','url','abstract','language'])
-        writer.writerow(row)
-
-def append_summary(row):
-    with open(SUMMARY_CSV, 'a', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        if os.path.getsize(SUMMARY_CSV) == 0:
-            writer.writerow(['filename','objective','methods','main_findings','relevance_notes'])
-        writer.writerow(row)
+        f.writelines(f"{url}\t{preferred}\n" for url, preferred in pairs)
+
+CACHE_DIR = os.path.join(BASE_DIR, '.cache')
+CACHE_MAX_AGE = 7 * 24 * 3600
 
+_disk_cached = disk_cached(CACHE_DIR, CACHE_MAX_AGE)
+
+METADATA_HEADER = ['filename','title','authors','year','journal','doi','url','abstract','language']
+SUMMARY_HEADER = ['filename','objective','methods','main_findings','relevance_notes']
+
+def _ensure_csv_headers():
+    """Write the CSV headers once at startup if the files are missing or empty."""
+    for path, header in ((METADATA_CSV, METADATA_HEADER), (SUMMARY_CSV, SUMMARY_HEADER)):
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                csv.writer(f).writerow(header)
+
+def recorded_filenames():
+    """File names already listed in metadata.csv, read once at startup."""
+    if not os.path.exists(METADATA_CSV):
+        return set()
+    with open(METADATA_CSV, 'r', encoding='utf-8', newline='') as f:
+        return {row.get('filename') for row in csv.DictReader(f)}
+
+def _append_rows(path, rows):
+    with open(path, 'a', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+def append_metadata(rows):
+    _append_rows(METADATA_CSV, rows)
+
+def append_summary(rows):
+    _append_rows(SUMMARY_CSV, rows)
+
+@_disk_cached
 def query_crossref(query, rows=100):
     q = parse.quote(query)
     url = f'https://api.crossref.org/works?query.title={q}&rows={rows}'
+    if MAILTO:
+        url += f'&mailto={parse.quote(MAILTO)}'
     try:
-        with request.urlopen(url, timeout=30) as resp:
-            data = resp.read()
-            return json.loads(data.decode('utf-8'))
-    except error.URLError as e:
+        if ijson is None:
+            resp = SESSION.get(url, headers=CROSSREF_HEADERS, timeout=30)
+            resp.raise_for_status()
+            return _json.loads(resp.content)
+        # parse items as they arrive and stop after `rows`, without buffering the whole body
+        with SESSION.get(url, headers=CROSSREF_HEADERS, stream=True, timeout=30) as resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = True
+            items = list(itertools.islice(ijson.items(resp.raw, 'message.items.item', use_float=True), rows))
+        return {'message': {'items': items}}
+    except _CROSSREF_ERRORS as e:
         print('CrossRef query error:', e)
         return None
 
 
+def query_crossref_sharded(keywords, rows=100):
+    """One CrossRef search per keyword, run concurrently; items interleaved rank by rank and merged by DOI."""
+    per_keyword = max(20, -(-rows // max(len(keywords), 1)))
+    with ThreadPoolExecutor(max_workers=CROSSREF_WORKERS) as ex:
+        pages = list(ex.map(lambda kw: query_crossref(kw, per_keyword), keywords))
+    shards = [p['message'].get('items', []) if p and 'message' in p else [] for p in pages]
+    merged = {}
+    for it in itertools.chain.from_iterable(itertools.zip_longest(*shards)):
+        if it is not None:
+            merged.setdefault((it.get('DOI') or '').lower() or id(it), it)
+    return list(merged.values())[:rows]
+
+
+def _item_text(doc, name):
+    el = doc.find(f'./Item[@Name="{name}"]')
+    return (el.text or '') if el is not None else ''
+
+@_disk_cached
 def query_pubmed(query, rows=50):
     """Query PubMed for papers."""
-    import xml.etree.ElementTree as ET
     base_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi'
     params = {'db': 'pubmed', 'term': query, 'retmax': rows, 'retmode': 'xml'}
     try:
-        resp = requests.get(base_url, params=params)
+        resp = SESSION.get(base_url, params=params)
         resp.raise_for_status()
-        root = ET.fromstring(resp.text)
+        root = ET.fromstring(resp.content)
         ids = [id_elem.text for id_elem in root.findall('.//Id')]
         # Fetch summaries
         if ids:
             summary_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi'
             summary_params = {'db': 'pubmed', 'id': ','.join(ids[:rows]), 'retmode': 'xml'}
-            summary_resp = requests.get(summary_url, params=summary_params)
+            summary_resp = SESSION.get(summary_url, params=summary_params)
             summary_resp.raise_for_status()
-            summary_root = ET.fromstring(summary_resp.text)
+            summary_root = ET.fromstring(summary_resp.content)
             items = []
-            for doc in summary_root.findall('.//DocSum'):
-                title = doc.find('.//Item[@Name="Title"]').text if doc.find('.//Item[@Name="Title"]') is not None else ''
-                authors = []
-                for author in doc.findall('.//Item[@Name="Author"]'):
-                    authors.append(author.text)
-                authors_s = '; '.join(authors)
-                year = doc.find('.//Item[@Name="PubDate"]').text[:4] if doc.find('.//Item[@Name="PubDate"]') else ''
-                journal = doc.find('.//Item[@Name="Source"]').text if doc.find('.//Item[@Name="Source"]') else ''
-                doi = ''
-                for id_elem in doc.findall('.//Item[@Name="DOI"]'):
-                    doi = id_elem.text
-                    break
-                url = f'https://pubmed.ncbi.nlm.nih.gov/{doc.find(".//Id").text}/' if doc.find('.//Id') else ''
+            # DocSum fields are direct children, so look them up once each with ./ paths
+            for doc in summary_root.iterfind('./DocSum'):
+                title = _item_text(doc, 'Title')
+                authors_s = '; '.join(a.text for a in doc.iterfind('./Item[@Name="AuthorList"]/Item[@Name="Author"]') if a.text)
+                year = _item_text(doc, 'PubDate')[:4]
+                journal = _item_text(doc, 'Source')
+                doi = _item_text(doc, 'DOI')
+                pmid = doc.findtext('./Id')
+                url = f'https://pubmed.ncbi.nlm.nih.gov/{pmid}/' if pmid else ''
                 abstract = ''  # PubMed summary doesn't include abstract
                 items.append({'title': title, 'authors': authors_s, 'year': year, 'journal': journal, 'doi': doi, 'url': url, 'abstract': abstract})
             return items
-    except Exception as e:
+    except (requests.RequestException, ET.ParseError) as e:
         print('PubMed query error:', e)
         return []
 
 def download_file(url, outpath, timeout=60):
-    """Download a URL to outpath."""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
-                      'Chrome/117.0.0.0 Safari/537.36'
-    }
+    """Stream `url` to `outpath`; returns False (and writes nothing) unless the body is a PDF."""
+    tmp = outpath + '.part'
     try:
-        req = request.Request(url, headers=headers)
-        with request.urlopen(req, timeout=timeout) as resp:
-            with open(outpath, 'wb') as f:
-                f.write(resp.read())
+        _throttle_host(url)
+        with _host_slot(url), SESSION.get(url, stream=True, timeout=timeout) as resp:
+            resp.raise_for_status()
+            if 'html' in resp.headers.get('Content-Type', '').lower():
+                print('Not a PDF (got', resp.headers['Content-Type'] + '):', url)
+                return False
+            # write 64 KiB at a time so memory per download stays constant
+            chunks = resp.iter_content(chunk_size=65536)
+            head = next(chunks, b'')
+            # mirrors often answer 200 with a captcha/landing page, so check the magic bytes
+            if not head.startswith(b'%PDF-'):
+                print('Not a PDF:', url)
+                return False
+            with open(tmp, 'wb', buffering=1 << 20) as f:
+                f.write(head)
+                for chunk in chunks:
+                    f.write(chunk)
+        os.replace(tmp, outpath)  # only complete PDFs ever appear under their final name
         return True
-    except Exception as e:
+    except (requests.RequestException, OSError) as e:
         print('Download failed for', url, ':', e)
+        if os.path.exists(tmp):
+            os.remove(tmp)  # don't leave a truncated PDF behind
         return False
 
 
+def _libgen_rows(html, rows):
+    """Yield (column_texts, download_href) for the first `rows` result rows of a LibGen page."""
+    if HTMLParser is not None:
+        for row in HTMLParser(html).css('table tr')[1:rows+1]:
+            link = row.css_first('a[href*=download]')
+            yield [c.text(strip=True) for c in row.css('td')], link.attributes.get('href', '') if link else ''
+        return
+    for row in _TR.findall(html)[1:rows+1]:  # Skip header
+        cols = [_TAG.sub('', c).strip() for c in _TD.findall(row)]
+        mirrors = _DOWNLOAD_HREF.findall(row)
+        yield cols, mirrors[0] if mirrors else ''
+
+
+@_disk_cached
 def query_libgen(query, rows=20):
     """Query LibGen for papers."""
     # LibGen search URL - try alternative mirrors
@@ -148,21 +306,13 @@ def query_libgen(query, rows=20):
     for search_url in search_urls:
         try:
             params = {'req': query, 'lg_topic': 'libgen', 'open': '0', 'view': 'simple', 'res': rows, 'phrase': '1', 'column': 'def'}
-            resp = requests.get(search_url, params=params, timeout=30)
+            resp = SESSION.get(search_url, params=params, timeout=30)
             resp.raise_for_status()
             # Parse HTML for results
             items = []
-            # Look for table rows with paper info
-            rows_html = re.findall(r'<tr.*?>(.*?)</tr>', resp.text, re.DOTALL)
-            for row in rows_html[1:rows+1]:  # Skip header
-                cols = re.findall(r'<td.*?>(.*?)</td>', row, re.DOTALL)
+            for cols, pdf_url in _libgen_rows(resp.text, rows):
                 if len(cols) >= 9:
-                    title = re.sub(r'<[^>]+>', '', cols[2]).strip()
-                    authors = re.sub(r'<[^>]+>', '', cols[1]).strip()
-                    year = re.sub(r'<[^>]+>', '', cols[4]).strip()
-                    # Look for download links
-                    mirrors = re.findall(r'href="([^"]*download[^"]*)"', row)
-                    pdf_url = mirrors[0] if mirrors else ''
+                    title, authors, year = cols[2], cols[1], cols[4]
                     if pdf_url.startswith('/'):
                         base_url = search_url.replace('/search.php', '')
                         pdf_url = base_url + pdf_url
@@ -170,109 +320,105 @@ def query_libgen(query, rows=20):
                     url = pdf_url
                     items.append({'title': title, 'authors': authors, 'year': year, 'journal': '', 'doi': doi, 'url': url, 'pdf_url': pdf_url, 'abstract': ''})
             return items
-        except Exception as e:
+        except requests.RequestException as e:
             print(f'LibGen query error with {search_url}:', e)
             continue
     return []
-    """Query PubMed for papers."""
-    import xml.etree.ElementTree as ET
-    base_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi'
-    params = {'db': 'pubmed', 'term': query, 'retmax': rows, 'retmode': 'xml'}
+
+
+SCIHUB_MIRRORS = ['https://sci-hub.se/', 'https://sci-hub.ru/', 'https://sci-hub.st/']
+SCIHUB_CONCURRENT_DOIS = 5  # be polite: at most this many DOIs in flight
+
+
+def _scihub_probe(base_url, doi, timeout):
+    """Return the PDF link for `doi` on one Sci-Hub mirror, or None."""
     try:
-        resp = requests.get(base_url, params=params)
-        resp.raise_for_status()
-        root = ET.fromstring(resp.text)
-        ids = [id_elem.text for id_elem in root.findall('.//Id')]
-        # Fetch summaries
-        if ids:
-            summary_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi'
-            summary_params = {'db': 'pubmed', 'id': ','.join(ids[:rows]), 'retmode': 'xml'}
-            summary_resp = requests.get(summary_url, params=summary_params)
-            summary_resp.raise_for_status()
-            summary_root = ET.fromstring(summary_resp.text)
-            items = []
-            for doc in summary_root.findall('.//DocSum'):
-                title = doc.find('.//Item[@Name="Title"]').text if doc.find('.//Item[@Name="Title"]') is not None else ''
-                authors = []
-                for author in doc.findall('.//Item[@Name="Author"]'):
-                    authors.append(author.text)
-                authors_s = '; '.join(authors)
-                year = doc.find('.//Item[@Name="PubDate"]').text[:4] if doc.find('.//Item[@Name="PubDate"]') else ''
-                journal = doc.find('.//Item[@Name="Source"]').text if doc.find('.//Item[@Name="Source"]') else ''
-                doi = ''
-                for id_elem in doc.findall('.//Item[@Name="DOI"]'):
-                    doi = id_elem.text
-                    break
-                url = f'https://pubmed.ncbi.nlm.nih.gov/{doc.find(".//Id").text}/' if doc.find('.//Id') else ''
-                abstract = ''  # PubMed summary doesn't include abstract
-                items.append({'title': title, 'authors': authors_s, 'year': year, 'journal': journal, 'doi': doi, 'url': url, 'abstract': abstract})
-            return items
-    except Exception as e:
-        print('PubMed query error:', e)
-        return []
+        resp = SESSION.get(f'{base_url}{doi}', timeout=timeout)
+        if resp.status_code != 200:
+            return None
+        # Look for PDF download link
+        pdf_match = _PDF_HREF.search(resp.text)
+        if not pdf_match:
+            return None
+        pdf_url = pdf_match.group(1)
+        if pdf_url.startswith('//'):
+            pdf_url = 'https:' + pdf_url
+        elif pdf_url.startswith('/'):
+            pdf_url = base_url.rstrip('/') + pdf_url
+        return pdf_url
+    except requests.RequestException:
+        return None
 
 
-def query_libgen(query, rows=20):
-    """Query LibGen for papers."""
-    # LibGen search URL
-    search_url = 'https://libgen.is/search.php'
-    params = {'req': query, 'lg_topic': 'libgen', 'open': '0', 'view': 'simple', 'res': rows, 'phrase': '1', 'column': 'def'}
+def _scihub_first(doi, timeout):
+    """Ask every mirror at once and return the first PDF link that comes back."""
+    ex = ThreadPoolExecutor(max_workers=len(SCIHUB_MIRRORS))
     try:
-        resp = requests.get(search_url, params=params, timeout=30)
-        resp.raise_for_status()
-        # Parse HTML for results
-        items = []
-        # Look for table rows with paper info
-        rows_html = re.findall(r'<tr.*?>(.*?)</tr>', resp.text, re.DOTALL)
-        for row in rows_html[1:rows+1]:  # Skip header
-            cols = re.findall(r'<td.*?>(.*?)</td>', row, re.DOTALL)
-            if len(cols) >= 9:
-                title = re.sub(r'<[^>]+>', '', cols[2]).strip()
-                authors = re.sub(r'<[^>]+>', '', cols[1]).strip()
-                year = re.sub(r'<[^>]+>', '', cols[4]).strip()
-                # Look for download links
-                mirrors = re.findall(r'href="([^"]*download[^"]*)"', row)
-                pdf_url = mirrors[0] if mirrors else ''
-                if pdf_url.startswith('/'):
-                    pdf_url = 'https://libgen.is' + pdf_url
-                doi = ''  # LibGen doesn't always have DOI
-                url = pdf_url
-                items.append({'title': title, 'authors': authors, 'year': year, 'journal': '', 'doi': doi, 'url': url, 'pdf_url': pdf_url, 'abstract': ''})
-        return items
-    except Exception as e:
-        print('LibGen query error:', e)
-        return []
+        futures = [ex.submit(_scihub_probe, base, doi, timeout) for base in SCIHUB_MIRRORS]
+        for fut in as_completed(futures):
+            pdf_url = fut.result()
+            if pdf_url:
+                return {'doi': doi, 'pdf_url': pdf_url}
+        return None
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)  # don't wait on slower mirrors
 
 
 def query_scihub(dois, timeout=30):
     """Query Sci-Hub for papers by DOI."""
-    items = []
-    scihub_urls = ['https://sci-hub.se/', 'https://sci-hub.ru/', 'https://sci-hub.st/']
-    
-    for doi in dois[:10]:  # Limit to avoid too many requests
-        if not doi:
-            continue
-        for base_url in scihub_urls:
-            try:
-                # Sci-Hub URL for DOI
-                scihub_url = f'{base_url}{doi}'
-                resp = requests.get(scihub_url, timeout=timeout, headers={
-                    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36'
-                })
-                if resp.status_code == 200:
-                    # Look for PDF download link
-                    pdf_match = re.search(r'href="([^"]*\.pdf[^"]*)"', resp.text)
-                    if pdf_match:
-                        pdf_url = pdf_match.group(1)
-                        if pdf_url.startswith('//'):
-                            pdf_url = 'https:' + pdf_url
-                        elif pdf_url.startswith('/'):
-                            pdf_url = base_url.rstrip('/') + pdf_url
-                        items.append({'doi': doi, 'pdf_url': pdf_url})
-                        break  # Found it, move to next DOI
-            except Exception as e:
-                continue  # Try next mirror
-    return items
+    dois = [d for d in dois[:10] if d]  # Limit to avoid too many requests
+    with ThreadPoolExecutor(max_workers=SCIHUB_CONCURRENT_DOIS) as ex:
+        return [hit for hit in ex.map(lambda d: _scihub_first(d, timeout), dois) if hit]
+
+
+def normalize_title(it):
+    """Lower-cased title with whitespace and punctuation removed."""
+    title = it.get('title') or ''
+    if isinstance(title, list):  # CrossRef gives a list of titles
+        title = ' '.join(title)
+    return _NONWORD.sub('', title).lower()
+
+
+def dedup_items(*sources):
+    """Drop repeats of the same paper across sources, keeping the first (CrossRef first).
+
+    Returns (kept items, DOIs to look up on Sci-Hub), both gathered in one pass; items
+    that already carry a pdf_url (LibGen) need no lookup.
+    """
+    seen = set()
+    kept = []
+    dois = []
+    total = 0
+    for it in itertools.chain(*sources):
+        total += 1
+        doi = it.get('DOI') or it.get('doi')
+        title = normalize_title(it)
+        if doi or title:
+            key = (doi or hashlib.md5(title.encode('utf-8')).hexdigest()).lower()
+            if key in seen:
+                continue
+            seen.add(key)
+        # records with neither DOI nor title have nothing to match on; never treat them as repeats
+        kept.append(it)
+        if doi and 'pdf_url' not in it:
+            dois.append(doi)
+    if len(kept) < total:
+        print('Skipped', total - len(kept), 'duplicate records')
+    return kept, dois
+
+
+def fetch_pdf(title, url, pdf_path, source=''):
+    """Download one queued PDF and report the outcome."""
+    if not needs_download(SESSION, url, pdf_path, _throttle_host):
+        return True
+    suffix = ' ' + source if source else ''
+    print(f'Downloading{suffix}:', title[:80])
+    ok = download_file(url, pdf_path)
+    if ok:
+        print('Saved to', pdf_path)
+    else:
+        print(f'Failed to download{suffix}', url)
+    return ok
 
 
 def main():
@@ -289,33 +435,28 @@ def main():
     query = ' '.join(kws[:12])
     print('English query:', query)
 
-    # Search CrossRef
-    resp = query_crossref(query, rows=args.max)
-    crossref_items = resp['message'].get('items', []) if resp and 'message' in resp else []
+    # CrossRef, PubMed and LibGen are independent hosts, so query them in parallel
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        f_cr = ex.submit(query_crossref_sharded, kws[:12], args.max)
+        f_pm = ex.submit(query_pubmed, query, args.max)
+        f_lg = ex.submit(query_libgen, query, min(args.max, 20))
+
+    crossref_items = f_cr.result()
     print('Found', len(crossref_items), 'items from CrossRef')
 
-    # Also PubMed
-    pubmed_items = query_pubmed(query, rows=args.max) or []
+    pubmed_items = f_pm.result() or []
     print('Found', len(pubmed_items), 'items from PubMed')
 
-    # Also LibGen
     libgen_items = []
     try:
-        libgen_items = query_libgen(query, rows=min(args.max, 20)) or []
+        libgen_items = f_lg.result() or []
         print('Found', len(libgen_items), 'items from LibGen')
     except Exception as e:
         print('LibGen search failed:', e)
 
-    items = crossref_items + pubmed_items + libgen_items  # Combine
+    # a paper found by both CrossRef and PubMed gets a single Sci-Hub lookup
+    items, dois = dedup_items(crossref_items, pubmed_items, libgen_items)
 
-    # Collect DOIs for Sci-Hub
-    dois = []
-    for it in crossref_items + pubmed_items:
-        if 'DOI' in it and it.get('DOI'):
-            dois.append(it['DOI'])
-        elif isinstance(it, dict) and it.get('doi'):
-            dois.append(it['doi'])
-    
     # Search Sci-Hub for PDFs
     scihub_items = []
     if dois:
@@ -326,7 +467,13 @@ def main():
             print('Sci-Hub search failed:', e)
 
     # Process items
+    _ensure_csv_headers()
+    recorded = recorded_filenames()
     count = 0
+    downloads = []
+    queued = set()
+    queued_urls = set()  # the same PDF link can come back under several records
+    url_rows, meta_rows, summary_rows = [], [], []
     for it in items:
         if 'DOI' in it:  # CrossRef
             doi = it.get('DOI', '')
@@ -374,27 +521,26 @@ def main():
             pdf_url = None  # PubMed doesn't provide PDF links directly
 
         last_author = authors_s.split(';')[0].strip().split()[-1] if authors_s else 'anon'
-        short = re.sub(r'\W+', '_', title)[:50]
+        short = _NONWORD.sub('_', title)[:50]
         filename_base = f"{year}_{last_author}_{short}" if year else f"{last_author}_{short}"
         filename_base = sanitize_filename(filename_base)
         pdf_name = filename_base + '.pdf'
         pdf_path = os.path.join(REF_DIR, pdf_name)
 
         preferred_url = pdf_url or url_field or ''
-        if preferred_url:
-            append_urls(preferred_url, pdf_name)
+        if pdf_name not in recorded:  # re-runs must not duplicate rows
+            recorded.add(pdf_name)
+            if preferred_url:
+                url_rows.append((preferred_url, pdf_name))
 
-        append_metadata([pdf_name, title, authors_s, year, journal, doi, preferred_url, abstract, 'en'])
-        append_summary([pdf_name, '', '', '', ''])
+            meta_rows.append([pdf_name, title, authors_s, year, journal, doi, preferred_url, abstract, 'en'])
+            summary_rows.append([pdf_name, '', '', '', ''])
 
         if pdf_url:
-            if not os.path.exists(pdf_path):
-                print('Downloading PDF:', title[:80])
-                ok = download_file(pdf_url, pdf_path)
-                if ok:
-                    print('Saved to', pdf_path)
-                else:
-                    print('Failed to download', pdf_url)
+            if pdf_path not in queued and url_key(pdf_url) not in queued_urls:
+                queued.add(pdf_path)  # two workers must not write the same file
+                queued_urls.add(url_key(pdf_url))
+                downloads.append((title, pdf_url, pdf_path, ''))
         elif doi:
             # Try Sci-Hub for items with DOI but no direct PDF
             scihub_pdf = None
@@ -402,17 +548,22 @@ def main():
                 if sci_item.get('doi') == doi:
                     scihub_pdf = sci_item.get('pdf_url')
                     break
-            if scihub_pdf and not os.path.exists(pdf_path):
-                print('Downloading from Sci-Hub:', title[:80])
-                ok = download_file(scihub_pdf, pdf_path)
-                if ok:
-                    print('Saved to', pdf_path)
-                else:
-                    print('Failed to download from Sci-Hub', scihub_pdf)
+            if scihub_pdf and pdf_path not in queued and url_key(scihub_pdf) not in queued_urls:
+                queued.add(pdf_path)
+                queued_urls.add(url_key(scihub_pdf))
+                downloads.append((title, scihub_pdf, pdf_path, 'from Sci-Hub'))
         count += 1
         if count >= args.max:
             break
-        time.sleep(0.8)
+
+    # one write per file, before the downloads start
+    append_urls(url_rows)
+    append_metadata(meta_rows)
+    append_summary(summary_rows)
+
+    # Downloads are network-bound and independent, so overlap them
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        list(executor.map(lambda job: fetch_pdf(*job), downloads))
 
     print('English search done. Check', URLS_FILE, 'and', METADATA_CSV)
 
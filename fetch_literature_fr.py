@@ -2,22 +2,34 @@
 """Fetch literature using the French keyword section from keywords.md and download PDFs.
 
 Writes/updates: urls.txt, metadata.csv, summary.csv and downloads PDFs into References/.
+Set CROSSREF_MAILTO=you@example.org to use CrossRef's polite pool.
 """
 import argparse
 import csv
+import itertools
 import json
 import os
 import re
 import sys
 import time
-from urllib import parse, request, error
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:
     print('requests library not found. Install with: pip install requests')
     sys.exit(1)
 
+from fetch_common import disk_cached, needs_download, url_key
+
+try:
+    import orjson as _json  # faster decode of CrossRef pages; takes bytes directly
+except ImportError:
+    _json = json
+
 BASE_DIR = os.path.dirname(__file__)
 KW_FILE = os.path.join(BASE_DIR, 'keywords.md')
 URLS_FILE = os.path.join(BASE_DIR, 'urls.txt')
@@ -25,66 +37,105 @@ METADATA_CSV = os.path.join(BASE_DIR, 'metadata.csv')
 SUMMARY_CSV = os.path.join(BASE_DIR, 'summary.csv')
 REF_DIR = os.path.join(BASE_DIR, 'References')
 
+# Contact address for CrossRef's "polite" pool (faster, less throttled than anonymous access)
+MAILTO = os.environ.get('CROSSREF_MAILTO', '')
+CROSSREF_HEADERS = {'User-Agent': f'ChiMai-Lit/1.0 (mailto:{MAILTO})'} if MAILTO else {}
+CROSSREF_FIELDS = 'DOI,title,author,container-title,published-print,published-online'
+
 os.makedirs(REF_DIR, exist_ok=True)
 
+USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/117.0.0.0 Safari/537.36')
+
+# Shared keep-alive session: CrossRef is paged and publisher PDFs come from
+# a handful of hosts, so reuse pooled connections rather than a new TCP+TLS per call.
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': USER_AGENT})
+SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                      max_retries=Retry(total=3, backoff_factor=0.3,
+                                                        status_forcelist=[429, 500, 502, 503, 504])))
+
+DOWNLOAD_WORKERS = 16
+SCIHUB_WORKERS = 4
+CROSSREF_WORKERS = 8  # concurrent per-keyword CrossRef searches
+
+_WS = re.compile(r'\s+')
+_SECTION = re.compile(r'^##\s+', re.MULTILINE)
+_RULE = re.compile(r'^---', re.MULTILINE)
+_NONFN = re.compile(r'[^\w\-_\.]')
+_PDF_HREF = re.compile(r'href="([^"]*\.pdf[^"]*)"')
+
+def _fold(s):
+    """Lower-case ASCII form of s, so 'Français' matches however the file encodes the accent."""
+    return unicodedata.normalize('NFKD', s).encode('ascii', 'ignore').decode('ascii').lower()
+
 def extract_french_keywords():
-    lines = []
-    in_fr = False
     with open(KW_FILE, 'r', encoding='utf-8') as f:
-        for line in f:
-            s = line.strip()
-            if s.lower().startswith('## français'):
-                in_fr = True
-                continue
-            if in_fr:
-                if s.startswith('## ') or s.startswith('---') or (s == '' and lines):  # Break on next section or separator
-                    break
-                if not s or s.startswith('#'):
-                    continue
-                if s.startswith('-'):
-                    s = s[1:].strip()
-                lines.append(s)
+        text = f.read()
+    for section in _SECTION.split(text)[1:]:
+        heading, _, body = section.partition('\n')
+        if _fold(heading).startswith('francais'):
+            break
+    else:
+        return []
+    body = _RULE.split(body, 1)[0]  # notes after a "---" rule are not keywords
+    lines = []
+    for line in body.splitlines():
+        s = line.strip()
+        if not s and lines:
+            break  # a blank line after the keywords ends the list
+        if not s or s.startswith('#'):
+            continue
+        lines.append(s[1:].strip() if s.startswith('-') else s)
     return lines
 
 def sanitize_filename(s):
-    s = re.sub(r'\s+', '_', s)
-    s = re.sub(r'[^\w\-_\.]', '', s)
+    s = _WS.sub('_', s)
+    s = _NONFN.sub('', s)
     return s
 
+CACHE_DIR = os.path.join(BASE_DIR, '.cache')
+CACHE_MAX_AGE = 7 * 24 * 3600
+
+_disk_cached = disk_cached(CACHE_DIR, CACHE_MAX_AGE)
+
+@_disk_cached
 def query_crossref(keywords, max_results=250):
-    """Query CrossRef API with pagination."""
+    """Query CrossRef API, following its deep-paging cursor."""
     base_url = 'https://api.crossref.org/works'
     all_items = []
-    offset = 0
+    cursor = '*'
     rows = 50  # items per page
+    query = ' '.join(keywords)
 
     while len(all_items) < max_results:
-        query = ' '.join(keywords)
         params = {
             'query': query,
             'rows': min(rows, max_results - len(all_items)),
-            'offset': offset,
+            'cursor': cursor,
             'sort': 'relevance',
-            'order': 'desc'
+            'order': 'desc',
+            'select': CROSSREF_FIELDS,  # only what process_items reads; pages are far smaller
         }
+        if MAILTO:
+            params['mailto'] = MAILTO
 
-        url = f"{base_url}?{parse.urlencode(params)}"
-        print(f"Querying CrossRef: {query} (offset: {offset})")
+        print(f"Querying CrossRef: {query} ({len(all_items)} so far)")
 
         try:
-            with request.urlopen(url, timeout=30) as response:
-                data = json.loads(response.read().decode('utf-8'))
-                items = data.get('message', {}).get('items', [])
-                all_items.extend(items)
-
-                if len(items) < rows:
-                    break  # no more results
-
-                offset += rows
-                time.sleep(1)  # rate limiting
-
-        except error.HTTPError as e:
-            print(f"HTTP Error: {e.code} - {e.reason}")
+            response = SESSION.get(base_url, params=params, headers=CROSSREF_HEADERS, timeout=30)
+            response.raise_for_status()
+            data = _json.loads(response.content)
+            message = data.get('message', {})
+            items = message.get('items', [])
+            all_items.extend(items)
+
+            cursor = message.get('next-cursor')
+            if len(items) < params['rows'] or not cursor:
+                break  # no more results
+
+        except requests.HTTPError as e:
+            print(f"HTTP Error: {e.response.status_code} - {e.response.reason}")
             break
         except Exception as e:
             print(f"Error querying CrossRef: {e}")
@@ -92,97 +143,151 @@ def query_crossref(keywords, max_results=250):
 
     return all_items[:max_results]
 
+def query_crossref_sharded(keywords, max_results=250):
+    """One CrossRef search per keyword, run concurrently and merged by DOI.
+
+    Short single-keyword queries match far better than all keywords joined into one
+    long query. Shards are interleaved rank by rank so every keyword contributes its
+    best hits before any keyword's weaker ones.
+    """
+    per_keyword = max(20, -(-max_results // max(len(keywords), 1)))
+    with ThreadPoolExecutor(max_workers=CROSSREF_WORKERS) as executor:
+        shards = list(executor.map(lambda kw: query_crossref([kw], per_keyword) or [], keywords))
+    merged = {}
+    for item in itertools.chain.from_iterable(itertools.zip_longest(*shards)):
+        if item is not None:
+            merged.setdefault((item.get('DOI') or '').lower() or id(item), item)
+    return list(merged.values())[:max_results]
+
 def query_libgen(keywords):
     """Query LibGen for books/papers."""
     query = '+'.join(keywords)
     url = f"https://libgen.is/search.php?req={query}&lg_topic=libgen&open=0&view=simple&res=10&phrase=1&column=def"
 
     try:
-        with request.urlopen(url, timeout=30) as response:
-            html = response.read().decode('utf-8')
-            # Simple regex to extract DOIs or titles (simplified)
-            items = []
-            # This is a placeholder - LibGen scraping is complex
-            return items
+        response = SESSION.get(url, timeout=30)
+        html = response.text
+        # Simple regex to extract DOIs or titles (simplified)
+        items = []
+        # This is a placeholder - LibGen scraping is complex
+        return items
     except Exception as e:
         print(f"LibGen query error: {e}")
         return []
 
+def _scihub_lookup(doi):
+    """PDF link for `doi` on Sci-Hub, or None."""
+    try:
+        # Sci-Hub URL construction (may vary)
+        scihub_url = f"https://sci-hub.se/{doi}"
+        response = SESSION.get(scihub_url, timeout=30)
+        html = response.text
+        # Extract PDF URL (simplified regex)
+        match = _PDF_HREF.search(html)
+        if not match:
+            return None
+        pdf_url = match.group(1)
+        if pdf_url.startswith('//'):
+            pdf_url = 'https:' + pdf_url
+        return pdf_url
+    except Exception as e:
+        print(f"Sci-Hub error for {doi}: {e}")
+        return None
+
 def query_scihub(dois):
-    """Query Sci-Hub for PDFs using DOIs."""
-    pdf_urls = []
-    for doi in dois:
-        try:
-            # Sci-Hub URL construction (may vary)
-            scihub_url = f"https://sci-hub.se/{doi}"
-            with request.urlopen(scihub_url, timeout=30) as response:
-                html = response.read().decode('utf-8')
-                # Extract PDF URL (simplified regex)
-                match = re.search(r'href="([^"]*\.pdf[^"]*)"', html)
-                if match:
-                    pdf_urls.append(match.group(1))
-        except Exception as e:
-            print(f"Sci-Hub error for {doi}: {e}")
-    return pdf_urls
+    """Query Sci-Hub for PDFs using DOIs; returns {doi: pdf_url} for the hits."""
+    # a few lookups at a time; Sci-Hub throttles aggressive clients
+    with ThreadPoolExecutor(max_workers=SCIHUB_WORKERS) as executor:
+        return {doi: url for doi, url in zip(dois, executor.map(_scihub_lookup, dois)) if url}
 
 def download_pdf(url, filename):
     """Download PDF from URL."""
+    filepath = os.path.join(REF_DIR, filename)
+    if not needs_download(SESSION, url, filepath):
+        return True
+    tmp = filepath + '.part'
     try:
-        with request.urlopen(url, timeout=30) as response:
-            if response.headers.get('content-type', '').startswith('application/pdf'):
-                filepath = os.path.join(REF_DIR, filename)
-                with open(filepath, 'wb') as f:
-                    f.write(response.read())
-                print(f"Saved to {filepath}")
-                return True
+        # Stream the body in chunks so memory use doesn't grow with the PDF size
+        with SESSION.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=65536)
+            head = next(chunks, b'')
+            # publishers answer paywalls with 200 and an HTML page, so check the magic bytes too
+            if response.headers.get('content-type', '').startswith('application/pdf') and head.startswith(b'%PDF-'):
+                with open(tmp, 'wb', buffering=1 << 20) as f:
+                    f.write(head)
+                    for chunk in chunks:
+                        f.write(chunk)
             else:
                 print(f"Not a PDF: {url}")
+                return False
+        os.replace(tmp, filepath)  # a killed run never leaves a truncated .pdf
+        print(f"Saved to {filepath}")
+        return True
     except Exception as e:
         print(f"Failed to download {url}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
     return False
 
-def process_items(items, urls_file, metadata_csv, summary_csv):
-    """Process CrossRef items and update files."""
+def process_items(items, urls_file, metadata_csv, summary_csv, scihub_pdfs=None):
+    """Process CrossRef items and update files.
+
+    scihub_pdfs maps DOIs to Sci-Hub PDF links, used when no publisher PDF URL is known.
+    """
+    scihub_pdfs = scihub_pdfs or {}
     new_urls = []
     new_metadata = []
     new_summary = []
-
+    downloads = []
+    queued = set()
+    queued_urls = set()
+
+    # Load urls.txt once; checking membership against a set keeps the loop O(N)
+    seen = set()
+    if os.path.exists(urls_file):
+        with open(urls_file, 'r', encoding='utf-8') as f:
+            seen = {line.strip() for line in f}
+
+    for item in items:
+        title = item.get('title', [''])[0] if item.get('title') else ''
+        doi = item.get('DOI', '')
+        url = f"https://doi.org/{doi}" if doi else ''
+        authors = '; '.join([f"{a.get('given', '')} {a.get('family', '')}".strip()
+                           for a in item.get('author', [])])
+        year = item.get('published-print', {}).get('date-parts', [[None]])[0][0] or \
+               item.get('published-online', {}).get('date-parts', [[None]])[0][0] or ''
+        journal = item.get('container-title', [''])[0] if item.get('container-title') else ''
+
+        if url and url not in seen:
+            seen.add(url)
+            new_urls.append(url)
+
+        new_metadata.append([title, authors, year, journal, doi, url])
+        new_summary.append([title, url])
+
+        # Queue the PDF download
+        if doi:
+            filename = sanitize_filename(f"{year}_{authors.split(';')[0] if authors else 'Unknown'}_{title[:50]}.pdf")
+            pdf_url = f"https://www.sciencedirect.com/science/article/pii/{doi}" if 'sciencedirect' in url else \
+                      f"https://journals.asm.org/doi/pdf/10.1128/{doi.split('/')[-1]}" if 'asm.org' in url else \
+                      f"https://academic.oup.com/{'/'.join(doi.split('/')[:-1])}/article-pdf/{doi.split('/')[-1]}/{doi.split('/')[-1]}.pdf" if 'oup.com' in url else \
+                      scihub_pdfs.get(doi)
+            if pdf_url and filename not in queued and url_key(pdf_url) not in queued_urls:
+                queued.add(filename)
+                queued_urls.add(url_key(pdf_url))
+                downloads.append((pdf_url, filename))
+
+    # One writerows per file once all rows are known, instead of a write per item
     with open(urls_file, 'a', encoding='utf-8') as uf, \
          open(metadata_csv, 'a', newline='', encoding='utf-8') as mf, \
          open(summary_csv, 'a', newline='', encoding='utf-8') as sf:
+        csv.writer(uf).writerows([u] for u in new_urls)
+        csv.writer(mf).writerows(new_metadata)
+        csv.writer(sf).writerows(new_summary)
 
-        url_writer = csv.writer(uf)
-        meta_writer = csv.writer(mf)
-        sum_writer = csv.writer(sf)
-
-        for item in items:
-            title = item.get('title', [''])[0] if item.get('title') else ''
-            doi = item.get('DOI', '')
-            url = f"https://doi.org/{doi}" if doi else ''
-            authors = '; '.join([f"{a.get('given', '')} {a.get('family', '')}".strip()
-                               for a in item.get('author', [])])
-            year = item.get('published-print', {}).get('date-parts', [[None]])[0][0] or \
-                   item.get('published-online', {}).get('date-parts', [[None]])[0][0] or ''
-            journal = item.get('container-title', [''])[0] if item.get('container-title') else ''
-
-            if url and url not in [line.strip() for line in open(urls_file, 'r').readlines()]:
-                url_writer.writerow([url])
-                new_urls.append(url)
-
-            meta_writer.writerow([title, authors, year, journal, doi, url])
-            new_metadata.append([title, authors, year, journal, doi, url])
-
-            sum_writer.writerow([title, url])
-            new_summary.append([title, url])
-
-            # Try to download PDF
-            if doi:
-                filename = sanitize_filename(f"{year}_{authors.split(';')[0] if authors else 'Unknown'}_{title[:50]}.pdf")
-                pdf_url = f"https://www.sciencedirect.com/science/article/pii/{doi}" if 'sciencedirect' in url else \
-                          f"https://journals.asm.org/doi/pdf/10.1128/{doi.split('/')[-1]}" if 'asm.org' in url else \
-                          f"https://academic.oup.com/{'/'.join(doi.split('/')[:-1])}/article-pdf/{doi.split('/')[-1]}/{doi.split('/')[-1]}.pdf" if 'oup.com' in url else None
-                if pdf_url:
-                    download_pdf(pdf_url, filename)
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        list(executor.map(lambda job: download_pdf(*job), downloads))
 
     return len(new_urls), len(new_metadata)
 
@@ -199,7 +304,7 @@ def main():
     print(f"French keywords: {keywords}")
 
     # Query sources
-    crossref_items = query_crossref(keywords, args.max)
+    crossref_items = query_crossref_sharded(keywords, args.max)
     print(f"Found {len(crossref_items)} items from CrossRef")
 
     libgen_items = query_libgen(keywords)
@@ -211,7 +316,7 @@ def main():
     print(f"Found {len(scihub_pdfs)} PDFs from Sci-Hub")
 
     # Process and save
-    new_urls, new_meta = process_items(crossref_items, URLS_FILE, METADATA_CSV, SUMMARY_CSV)
+    new_urls, new_meta = process_items(crossref_items, URLS_FILE, METADATA_CSV, SUMMARY_CSV, scihub_pdfs)
 
     print(f"French search done. Check {URLS_FILE} and {METADATA_CSV}")
 